@@ -3,16 +3,123 @@ Console-Based Multi-Line Editor
 A simple editor supporting multi-line operations via text commands.
 """
 import re
-
-
-# Global Variables
-lines = []  # List of lines, starts empty
-line_cursor = 0  # Current line index (adjusted when lines are added/removed)
-row_cursor = 0  # Current character position in line
-show_line_cursor = False  # Toggle for line cursor display
-show_row_cursor = False  # Toggle for row cursor display
-copied_line = None  # Stores copied line for pasting
-command_stack = []  # History of commands for undo
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+UNDO_LIMIT = 50  # Oldest commands are dropped beyond this many
+
+
+class LineGapBuffer:
+    """Sequence of lines kept as a gap buffer around the last edited index.
+
+    Lines before the gap are stored in order in before, lines after it in
+    reverse order in after, so inserting or deleting at the gap is a list
+    append or pop. Edits follow the cursor, so the gap rarely moves far.
+    """
+    __slots__ = ('before', 'after', 'version')
+
+    def __init__(self, lines=()):
+        self.before = list(lines)
+        self.after = []
+        self.version = 0  # Bumped on every change, so readers can spot edits
+
+    def __len__(self):
+        return len(self.before) + len(self.after)
+
+    def __iter__(self):
+        yield from self.before
+        yield from reversed(self.after)
+
+    def _index(self, i):
+        """Return i as a non-negative index, as list indexing would."""
+        size = len(self.before) + len(self.after)
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError('line index out of range')
+        return i
+
+    def _move_gap(self, i):
+        """Move the gap so that it sits just before line i."""
+        before, after = self.before, self.after
+        if i < len(before):
+            after.extend(reversed(before[i:]))
+            del before[i:]
+        elif i > len(before):
+            count = i - len(before)
+            before.extend(reversed(after[-count:]))
+            del after[-count:]
+
+    # Indexing is on every command's path, so the bounds checks are inlined
+    def __getitem__(self, i):
+        before, after = self.before, self.after
+        gap, tail = len(before), len(after)
+        if i < 0:
+            i += gap + tail
+        if 0 <= i < gap:
+            return before[i]
+        j = gap + tail - 1 - i  # after is stored in reverse
+        if 0 <= j < tail:
+            return after[j]
+        raise IndexError('line index out of range')
+
+    def __setitem__(self, i, line):
+        before, after = self.before, self.after
+        gap, tail = len(before), len(after)
+        if i < 0:
+            i += gap + tail
+        if 0 <= i < gap:
+            before[i] = line
+        else:
+            j = gap + tail - 1 - i
+            if not 0 <= j < tail:
+                raise IndexError('line index out of range')
+            after[j] = line
+        self.version += 1
+
+    def __delitem__(self, i):
+        self._move_gap(self._index(i))
+        self.after.pop()
+        self.version += 1
+
+    def insert(self, i, line):
+        """Insert line before index i, clamped to the ends like list.insert."""
+        size = len(self)
+        if i < 0:
+            i = max(i + size, 0)
+        self._move_gap(min(i, size))
+        self.before.append(line)
+        self.version += 1
+
+    def append(self, line):
+        """Add line at the end of the document."""
+        self.insert(len(self), line)
+
+
+@dataclass
+class EditorState:
+    """Document, cursors and history of one editing session."""
+    # Lines, starting with a single empty one so there is always a current line
+    lines: LineGapBuffer = field(default_factory=lambda: LineGapBuffer(['']))
+    line_cursor: int = 0  # Current line index (adjusted when lines are added/removed)
+    row_cursor: int = 0  # Current character position in line
+    show_line_cursor: bool = False  # Toggle for line cursor display
+    show_row_cursor: bool = False  # Toggle for row cursor display
+    copied_line: Optional[str] = None  # Stores copied line for pasting
+    # History of commands for undo
+    command_stack: deque = field(default_factory=lambda: deque(maxlen=UNDO_LIMIT))
+    frame_key: Optional[tuple] = None  # What the cached frame was rendered from
+    frame: Optional[str] = None  # Last output of show_content
+
+
+_WORD_START = re.compile(r'(?<!\S)\S')  # First character of each word
+# Maps every whitespace character to ' ' for str.translate (none lie past U+3000)
+_SPACES = {c: ' ' for c in range(0x3001) if chr(c).isspace()}
+_GREEN = '\033[42m'  # ANSI green background, marks the row cursor
+_RESET = '\033[0m'  # ANSI reset after the row cursor
 
 
 
@@ -45,512 +152,481 @@ def display_help():
     q – quit program"""
     print(help_text)
 
-def ensure_line_exists():
-    """Ensure at least one line exists, adding an empty line if necessary."""
-    global line_cursor
+def replace_in_line(state, start, end, text=''):
+    """Replace characters start:end of the current line with text."""
+    line = state.lines[state.line_cursor]
+    state.lines[state.line_cursor] = line[:start] + text + line[end:]
 
-    if not lines:
-        lines.append('')
-        line_cursor = 0
+def next_word_start(line, pos):
+    """Return the start of the first word after pos, or None."""
+    # The search stops at the next word, so it costs nothing past it
+    match = _WORD_START.search(line, pos + 1)
+    return match.start() if match else None
 
-def toggle_row_cursor():
+def prev_word_start(line, pos):
+    """Return the start of the last word beginning before pos, or None."""
+    before = line[:max(pos, 0)].translate(_SPACES).rstrip(' ')
+    return before.rfind(' ') + 1 if before else None
+
+def toggle_row_cursor(state):
     """Toggle visibility of the row cursor."""
-    global show_row_cursor
-    show_row_cursor = not show_row_cursor
-    command_stack.append(('.',''))
+    state.show_row_cursor = not state.show_row_cursor
+    state.command_stack.append(('.',''))
 
-def toggle_line_cursor():
+def toggle_line_cursor(state):
     """Toggle visibility of the line cursor."""
-    global show_line_cursor
-    show_line_cursor = not show_line_cursor
-    command_stack.append((';',''))
+    state.show_line_cursor = not state.show_line_cursor
+    state.command_stack.append((';',''))
 
 
-def move_left():
+def move_left(state):
     """Move cursor left, if possible."""
-    global row_cursor
+    original_row_cursor = state.row_cursor
 
-    if row_cursor > 0:
-        row_cursor -= 1
+    if state.row_cursor > 0:
+        state.row_cursor -= 1
 
-    command_stack.append(('h',''))
+    state.command_stack.append(('h', original_row_cursor))
 
-def move_right():
+def move_right(state):
     """Move cursor right, within current line length."""
-    global lines, row_cursor, line_cursor
-    current_line = lines[line_cursor]
+    current_line = state.lines[state.line_cursor]
+    original_row_cursor = state.row_cursor
 
-    if row_cursor < len(current_line) - 1:
-        row_cursor += 1
+    if state.row_cursor < len(current_line) - 1:
+        state.row_cursor += 1
 
-    command_stack.append(('l', ''))
+    state.command_stack.append(('l', original_row_cursor))
 
-def move_up():
+def move_up(state):
     """Move cursor up, adjusting row position if needed."""
-    global lines, line_cursor, row_cursor
-    original_row_cursor = row_cursor
+    original_row_cursor = state.row_cursor
+    original_line_cursor = state.line_cursor
 
-    if line_cursor > 0:
-        row_cursor = min(row_cursor, len(lines[line_cursor - 1]) - 1)
-        line_cursor -= 1
+    if state.line_cursor > 0:
+        state.row_cursor = min(state.row_cursor, len(state.lines[state.line_cursor - 1]) - 1)
+        state.line_cursor -= 1
 
-    command_stack.append(('j', original_row_cursor))
+    state.command_stack.append(('j', original_row_cursor, original_line_cursor))
 
-def move_down():
+def move_down(state):
     """Move cursor down, adjusting row position if needed."""
-    global lines, line_cursor, row_cursor
-    original_row_cursor = row_cursor
+    original_row_cursor = state.row_cursor
+    original_line_cursor = state.line_cursor
 
-    if line_cursor < len(lines) - 1:
-        if lines[line_cursor + 1] == '':
-            line_cursor += 1
-            row_cursor = 0
+    if state.line_cursor < len(state.lines) - 1:
+        if state.lines[state.line_cursor + 1] == '':
+            state.line_cursor += 1
+            state.row_cursor = 0
         else:
-            row_cursor = min(row_cursor, len(lines[line_cursor + 1]) - 1)
-            line_cursor += 1
+            state.row_cursor = min(state.row_cursor, len(state.lines[state.line_cursor + 1]) - 1)
+            state.line_cursor += 1
 
-    command_stack.append(('k', original_row_cursor))
+    state.command_stack.append(('k', original_row_cursor, original_line_cursor))
 
-def move_line_start():
+def move_line_start(state):
     """Move cursor to the start of the current line."""
-    global row_cursor
-    original_row_cursor = row_cursor
-    row_cursor = 0
-    command_stack.append(('^', original_row_cursor))
+    original_row_cursor = state.row_cursor
+    state.row_cursor = 0
+    state.command_stack.append(('^', original_row_cursor))
 
-def move_line_end():
+def move_line_end(state):
     """Move cursor to the end of the current line."""
-    global lines, row_cursor, line_cursor
-    original_row_cursor = row_cursor
-    row_cursor = len(lines[line_cursor]) - 1
-    command_stack.append(('$', original_row_cursor))
+    original_row_cursor = state.row_cursor
+    state.row_cursor = len(state.lines[state.line_cursor]) - 1
+    state.command_stack.append(('$', original_row_cursor))
 
 
-def move_prev_word_start():
+def move_prev_word_start(state):
     """Move cursor to the start of the previous word."""
-    global row_cursor, line_cursor, command_stack
-
-    original_row = row_cursor
-    line = lines[line_cursor]
-    command_stack.append(('b', original_row))
+    original_row = state.row_cursor
+    line = state.lines[state.line_cursor]
+    state.command_stack.append(('b', original_row))
 
     if not line:
         return
 
-    matches = list(re.finditer(r'\S+', line))
-    word_spans = [(m.start(), m.end()) for m in matches]
+    # Also the start of the word the cursor is inside, if any
+    start = prev_word_start(line, original_row)
+    if start is not None:
+        state.row_cursor = start
 
-    # Find if cursor is inside a word
-    for start, end in reversed(word_spans):
-        if start < original_row < end:
-            row_cursor = start
-            return
-
-    # Find the largest start <= original_row
-    prev_starts = [start for start, _ in word_spans if start < original_row]
-    if prev_starts:
-        row_cursor = max(prev_starts)
-
-def move_next_word_start():
+def move_next_word_start(state):
     """Move cursor to the start of the next word."""
-    global row_cursor, line_cursor, command_stack
-
-    original_row = row_cursor
-    line = lines[line_cursor] if line_cursor < len(lines) else ''
-    command_stack.append(('w', original_row))
+    original_row = state.row_cursor
+    line = state.lines[state.line_cursor] if state.line_cursor < len(state.lines) else ''
+    state.command_stack.append(('w', original_row))
 
     if not line:
         return
 
-    matches = list(re.finditer(r'\S+', line))
-    next_starts = [m.start() for m in matches if m.start() > original_row]
+    start = next_word_start(line, original_row)
 
-    if next_starts:
-        row_cursor = min(next_starts)
+    if start is not None:
+        state.row_cursor = start
 
-def insert_text(text):
+def insert_text(state, text):
     """Insert text before the cursor and update position."""
-    global lines, row_cursor, line_cursor
-    ensure_line_exists()
-    line = lines[line_cursor]
-
-    if line == '':
-        lines[line_cursor] = text
-        cursor = 0
-        command_stack.append(('i1', text))
-    else:
-        lines[line_cursor] = line[:row_cursor] + text + line[row_cursor:]
-        command_stack.append(('i2', text))
-
-def append_text(text):
+    original_row_cursor = state.row_cursor
+    # Empty lines, and lines reached without a cursor update (such as after
+    # O), can leave row_cursor at -1 or past the end
+    line = state.lines[state.line_cursor]
+    state.row_cursor = min(max(state.row_cursor, 0), len(line))
+    replace_in_line(state, state.row_cursor, state.row_cursor, text)
+    state.command_stack.append(('i', text, original_row_cursor))
+
+def append_text(state, text):
     """Append text after the cursor and update position."""
-    global lines, row_cursor, line_cursor
-    ensure_line_exists()
-    line = lines[line_cursor]
-
-    if line == '':
-        lines[line_cursor] = text
-        row_cursor = len(text) - 1
-        command_stack.append(('a1', text))
-    else:
-        lines[line_cursor] = line[:row_cursor + 1] + text + line[row_cursor + 1:]
-        row_cursor += len(text)
-        command_stack.append(('a2', text))
+    pos = min(state.row_cursor + 1, len(state.lines[state.line_cursor]))
+    replace_in_line(state, pos, pos, text)
+    state.row_cursor = pos + len(text) - 1
+    state.command_stack.append(('a', text))
 
-def delete_char():
+def delete_char(state):
     """Delete the character at the cursor."""
-    global lines, row_cursor, line_cursor
-    line = lines[line_cursor]
-    deleted_char = line[row_cursor]
+    line = state.lines[state.line_cursor]
 
     if line:
-        if row_cursor < len(line) - 1:
-            lines[line_cursor] = line[:row_cursor] + line[row_cursor + 1:]
-            command_stack.append(('x1', deleted_char))
+        deleted_char = line[state.row_cursor]
+        if state.row_cursor < len(line) - 1:
+            replace_in_line(state, state.row_cursor, state.row_cursor + 1)
+            state.command_stack.append(('x1', deleted_char))
         else:
-            lines[line_cursor] = line[:row_cursor]
-            row_cursor -= 1
-            command_stack.append(('x2', deleted_char))
+            replace_in_line(state, state.row_cursor, len(line))
+            state.row_cursor -= 1
+            state.command_stack.append(('x2', deleted_char))
 
-def delete_word():
+def delete_word(state):
     """Delete from cursor to end of word and trailing spaces."""
-    global lines, row_cursor, line_cursor, command_stack
-
-    original_line = lines[line_cursor]
-    original_row = row_cursor
-    command_stack.append(('dw', original_line, original_row))
-
-    # Find next word start or end of line
-    matches = list(re.finditer(r'\S+', original_line))
-    next_starts = [m.start() for m in matches if m.start() > original_row]
-    if next_starts:
-        end_pos = min(next_starts)
-        lines[line_cursor] = original_line[:original_row] + original_line[end_pos:]
-    else:
-        lines[line_cursor] = original_line[:row_cursor]
-        row_cursor -= 1
-
-def copy_line():
+    original_line = state.lines[state.line_cursor]
+    original_row = state.row_cursor
+    state.command_stack.append(('dw', original_line, original_row))
+
+    # Delete up to the next word start, or to the end of the line
+    end_pos = next_word_start(original_line, original_row)
+    if end_pos is None:
+        end_pos = len(original_line)
+        if state.row_cursor > 0:
+            state.row_cursor -= 1
+    replace_in_line(state, original_row, end_pos)
+
+def copy_line(state):
     """Copy the current line to buffer."""
-    global lines, copied_line
-    copied_line = lines[line_cursor]
+    # Lines are immutable str, so this shares the line rather than copying it
+    state.copied_line = state.lines[state.line_cursor]
 
-def paste_above():
+def paste_above(state):
     """Paste copied line above current line."""
-    global lines, line_cursor, row_cursor
-    original_row_cursor = row_cursor
+    original_row_cursor = state.row_cursor
 
-    if copied_line is not None:
-        lines.insert(line_cursor, copied_line)
-        if copied_line == '':
-            row_cursor = 0
+    if state.copied_line is not None:
+        state.lines.insert(state.line_cursor, state.copied_line)
+        if state.copied_line == '':
+            state.row_cursor = 0
         else:
-            row_cursor = min(row_cursor, len(copied_line) - 1)
+            state.row_cursor = min(state.row_cursor, len(state.copied_line) - 1)
+        state.command_stack.append(('P', original_row_cursor, state.copied_line))
 
-    command_stack.append(('P', original_row_cursor, copied_line))
-
-def paste_below():
+def paste_below(state):
     """Paste copied line below current line."""
-    global lines, line_cursor, row_cursor
-    original_row_cursor = row_cursor
-
-    if line_cursor < len(lines) - 1:
-        lines.insert(line_cursor + 1, copied_line)
-        move_down()
-    else:
-        lines.append(copied_line)
-        move_down()
+    original_row_cursor = state.row_cursor
 
-    command_stack.append(('p', original_row_cursor, copied_line))
+    if state.copied_line is not None:
+        state.lines.insert(state.line_cursor + 1, state.copied_line)
+        # Step onto the pasted line without recording a separate 'k'
+        if state.copied_line == '':
+            state.row_cursor = 0
+        else:
+            state.row_cursor = min(state.row_cursor, len(state.copied_line) - 1)
+        state.line_cursor += 1
+        state.command_stack.append(('p', original_row_cursor, state.copied_line))
 
-def delete_line():
+def delete_line(state):
     """Delete the current line and adjust cursors."""
-    global lines, line_cursor, row_cursor
-    original_row_cursor = row_cursor
-
-    if line_cursor < len(lines) - 1:
-        command_stack.append(('dd1', lines[line_cursor], original_row_cursor))
-        row_cursor = min(row_cursor, len(lines[line_cursor + 1]) - 1)
-        lines.remove(lines[line_cursor])
+    original_row_cursor = state.row_cursor
+
+    if len(state.lines) == 1:
+        # The document always keeps one line, so empty it instead
+        state.command_stack.append(('dd3', state.lines[0], original_row_cursor))
+        state.lines[0] = ''
+        state.row_cursor = 0
+    elif state.line_cursor < len(state.lines) - 1:
+        state.command_stack.append(('dd1', state.lines[state.line_cursor], original_row_cursor))
+        state.row_cursor = min(state.row_cursor, len(state.lines[state.line_cursor + 1]) - 1)
+        del state.lines[state.line_cursor]
     else:
-        command_stack.append(('dd2', lines[line_cursor], original_row_cursor))
-        row_cursor = min(row_cursor, len(lines[line_cursor - 1]) - 1)
-        lines.remove(lines[line_cursor])
-        line_cursor -= 1
+        state.command_stack.append(('dd2', state.lines[state.line_cursor], original_row_cursor))
+        state.row_cursor = min(state.row_cursor, len(state.lines[state.line_cursor - 1]) - 1)
+        del state.lines[state.line_cursor]
+        state.line_cursor -= 1
 
 
-def insert_empty_line_below():
+def insert_empty_line_below(state):
     """Insert empty line below current line."""
-    global lines, row_cursor, line_cursor
-    original_row_cursor = row_cursor
+    original_row_cursor = state.row_cursor
 
-    if line_cursor == len(lines) - 1:
-        lines.append('')
-        move_down()
-    else:
-        lines.insert(line_cursor + 1, '')
-        move_down()
+    state.lines.insert(state.line_cursor + 1, '')
+    # Step onto the new line without recording a separate 'k'
+    state.line_cursor += 1
+    state.row_cursor = 0
 
-    command_stack.append(('o', original_row_cursor))
+    state.command_stack.append(('o', original_row_cursor))
 
-def insert_empty_line_above():
+def insert_empty_line_above(state):
     """Insert empty line above current line."""
-    lines.insert(line_cursor, '')
-    original_row_cursor = row_cursor
-    command_stack.append(('O', original_row_cursor))
-
-def quit():
-    global running
-    running = False
-
-def undo_last():
+    state.lines.insert(state.line_cursor, '')
+    original_row_cursor = state.row_cursor
+    state.command_stack.append(('O', original_row_cursor))
+
+def undo_toggle_row_cursor(state, cmd):
+    """Undo '.' by toggling the row cursor back."""
+    state.show_row_cursor = not state.show_row_cursor
+
+def undo_toggle_line_cursor(state, cmd):
+    """Undo ';' by toggling the line cursor back."""
+    state.show_line_cursor = not state.show_line_cursor
+
+def undo_line_move(state, cmd):
+    """Undo 'j' or 'k' by restoring the saved line and row cursors."""
+    state.line_cursor = cmd[2]
+    state.row_cursor = cmd[1]
+
+def undo_row_move(state, cmd):
+    """Undo 'h', 'l', '^', '$', 'b' or 'w' by restoring the saved row cursor."""
+    state.row_cursor = cmd[1]
+
+def undo_insert(state, cmd):
+    """Undo 'i' by removing the inserted text."""
+    replace_in_line(state, state.row_cursor, state.row_cursor + len(cmd[1]))
+    state.row_cursor = cmd[2]
+
+def undo_append(state, cmd):
+    """Undo 'a' by removing the appended text."""
+    start = state.row_cursor - len(cmd[1]) + 1
+    replace_in_line(state, start, state.row_cursor + 1)
+    state.row_cursor = max(start - 1, 0)
+
+def undo_delete_char(state, cmd):
+    """Undo 'x' by putting the deleted character back."""
+    replace_in_line(state, state.row_cursor, state.row_cursor, cmd[1])
+
+def undo_delete_last_char(state, cmd):
+    """Undo 'x' at the end of the line."""
+    end = len(state.lines[state.line_cursor])
+    replace_in_line(state, end, end, cmd[1])
+    state.row_cursor += 1
+
+def undo_delete_word(state, cmd):
+    """Undo 'dw' by restoring the saved line."""
+    state.lines[state.line_cursor] = cmd[1]
+    state.row_cursor = cmd[2]
+
+def undo_paste_above(state, cmd):
+    """Undo 'P' by removing the pasted line."""
+    del state.lines[state.line_cursor]
+    state.row_cursor = cmd[1]
+
+def undo_paste_below(state, cmd):
+    """Undo 'p' by removing the pasted line."""
+    del state.lines[state.line_cursor]
+    state.line_cursor -= 1
+    state.row_cursor = cmd[1]
+
+def undo_delete_line(state, cmd):
+    """Undo 'dd' by restoring the deleted line."""
+    state.lines.insert(state.line_cursor, cmd[1])
+    state.row_cursor = cmd[2]
+
+def undo_delete_last_line(state, cmd):
+    """Undo 'dd' on the last line."""
+    state.lines.append(cmd[1])
+    state.line_cursor += 1
+    state.row_cursor = cmd[2]
+
+def undo_clear_line(state, cmd):
+    """Undo 'dd' on the only line by restoring its text."""
+    state.lines[0] = cmd[1]
+    state.row_cursor = cmd[2]
+
+def undo_insert_line_below(state, cmd):
+    """Undo 'o' by removing the inserted line."""
+    del state.lines[state.line_cursor]
+    state.line_cursor -= 1
+    state.row_cursor = cmd[1]
+
+def undo_insert_line_above(state, cmd):
+    """Undo 'O' by removing the inserted line."""
+    del state.lines[state.line_cursor]
+    state.row_cursor = cmd[1]
+
+# Inverse of each command, keyed on the id stored in its command_stack record
+UNDO_COMMANDS = {
+    '.': undo_toggle_row_cursor,
+    ';': undo_toggle_line_cursor,
+    'h': undo_row_move,
+    'l': undo_row_move,
+    'j': undo_line_move,
+    'k': undo_line_move,
+    '^': undo_row_move,
+    '$': undo_row_move,
+    'b': undo_row_move,
+    'w': undo_row_move,
+    'i': undo_insert,
+    'a': undo_append,
+    'x1': undo_delete_char,
+    'x2': undo_delete_last_char,
+    'dw': undo_delete_word,
+    'P': undo_paste_above,
+    'p': undo_paste_below,
+    'dd1': undo_delete_line,
+    'dd2': undo_delete_last_line,
+    'dd3': undo_clear_line,
+    'o': undo_insert_line_below,
+    'O': undo_insert_line_above,
+}
+
+def undo_last(state):
     """Revert the last command if possible."""
-    global command_stack,show_row_cursor,show_line_cursor,row_cursor,line_cursor,lines
-
-    if command_stack:
-        cmd = command_stack.pop()
-        if cmd[0] == '.':
-            show_row_cursor = not show_row_cursor
-        elif cmd[0] == ';':
-            show_line_cursor = not show_line_cursor
-        elif cmd[0] == 'h':
-            row_cursor += 1
-        elif cmd[0] == 'l':
-            row_cursor -= 1
-        elif cmd[0] == 'j':
-            line_cursor += 1
-            row_cursor = cmd[1]
-        elif cmd[0] == 'k':
-            line_cursor -= 1
-            row_cursor = cmd[1]
-        elif cmd[0] == '^':
-            row_cursor = cmd[1]
-        elif cmd[0] == '$':
-            row_cursor = cmd[1]
-        elif cmd[0] == 'b':
-            row_cursor = cmd[1]
-        elif cmd[0] == 'w':
-            row_cursor = cmd[1]
-        elif cmd[0] == 'i1':
-            lines[line_cursor] = ''
-        elif cmd[0] == 'i2':
-            line = lines[line_cursor]
-            lines[line_cursor] = line[:row_cursor] + line[row_cursor + len(cmd[1]):]
-        elif cmd[0] == 'a1':
-            lines[line_cursor] = ''
-            row_cursor = 0
-        elif cmd[0] == 'a2':
-            line = lines[line_cursor]
-            lines[line_cursor] = line[:row_cursor - len(cmd[1]) + 1] + line[row_cursor + 1:]
-            row_cursor -= len(cmd[1])
-        elif cmd[0] == 'x1':
-            line = lines[line_cursor]
-            lines[line_cursor] = line[:row_cursor] + cmd[1] + line[row_cursor:]
-        elif cmd[0] == 'x2':
-            lines[line_cursor] = lines[line_cursor] + cmd[1]
-            row_cursor += 1
-        elif cmd[0] == 'dw':
-            lines[line_cursor] = cmd[1]
-            row_cursor = cmd[2]
-        elif cmd[0] == 'P':
-            delete_line()
-            row_cursor = cmd[1]
-        elif cmd[0] == 'p':
-            delete_line()
-            row_cursor = cmd[1]
-            line_cursor -= 1
-        elif cmd[0] == 'dd1':
-            lines.insert(line_cursor, cmd[1])
-            row_cursor = cmd[2]
-        elif cmd[0] == 'dd2':
-            lines.append(cmd[1])
-            line_cursor += 1
-            row_cursor = cmd[2]
-        elif cmd[0] == 'o':
-            lines.remove(lines[line_cursor])
-            line_cursor -= 1
-            row_cursor = cmd[1]
-        elif cmd[0] == 'O':
-            lines.remove(lines[line_cursor])
-            row_cursor = cmd[1]
-
-
-def repeat_last():
+    if state.command_stack:
+        cmd = state.command_stack.pop()
+        UNDO_COMMANDS[cmd[0]](state, cmd)
+
+# Command to re-run for each command_stack id, except text commands
+REPEAT_COMMANDS = {
+    '.': toggle_row_cursor,
+    ';': toggle_line_cursor,
+    'h': move_left,
+    'l': move_right,
+    'j': move_up,
+    'k': move_down,
+    '^': move_line_start,
+    '$': move_line_end,
+    'b': move_prev_word_start,
+    'w': move_next_word_start,
+    'x1': delete_char,
+    'x2': delete_char,
+    'dw': delete_word,
+    'P': paste_above,
+    'p': paste_below,
+    'dd1': delete_line,
+    'dd2': delete_line,
+    'dd3': delete_line,
+    'o': insert_empty_line_below,
+    'O': insert_empty_line_above,
+}
+
+def repeat_last(state):
     """Repeat the last valid command."""
-    if command_stack:
-        last_command = command_stack[-1]
-        if last_command[0] == '.':
-            toggle_row_cursor()
-        elif last_command[0] == ';':
-            toggle_line_cursor()
-        elif last_command[0] == 'h':
-            move_left()
-        elif last_command[0] == 'l':
-            move_right()
-        elif last_command[0] == 'j':
-            move_up()
-        elif last_command[0] == 'k':
-            move_down()
-        elif last_command[0] == '^':
-            move_cursor_to_start_of_line()
-        elif last_command[0] == '$':
-            move_cursor_to_end_of_line()
-        elif last_command[0] == 'b':
-            move_prev_word_start()
-        elif last_command[0] == 'w':
-            move_next_word_start()
-        elif last_command[0] == 'i1' or last_command[0] == 'i2':
-            insert_text(last_command[1])
-        elif last_command[0] == 'a1' or last_command[0] == 'a2':
-            append_text(last_command[1])
-        elif last_command[0] == 'x1' or last_command[0] == 'x2':
-            delete_char()
-        elif last_command[0] == 'dw':
-            delete_word()
-        elif last_command[0] == 'P':
-            paste_above(last_command[2])
-        elif last_command[0] == 'p':
-            paste_below(last_command[2])
-        elif last_command[0] == 'dd1' or last_command[0] == 'dd2':
-            delete_line()
-        elif last_command[0] == 'o':
-            insert_empty_line_below()
-        elif last_command[0] == 'O':
-            insert_empty_line_above()
-
-def show_content():
-    """Display current editor content with cursors."""
-    global lines, line_cursor,row_cursor,show_row_cursor,show_line_cursor
-
-    if lines:
-        if show_line_cursor is True:
-            for i in range(len(lines)):
-                if i == line_cursor:
-                    if show_row_cursor is True:
-                        before = lines[i][:row_cursor] if lines[i] != '' else ''
-                        after = lines[i][row_cursor + 1:] if len(lines[i]) > 1 else ''
-                        cursor = lines[i][row_cursor] if lines[i] != '' else ''
-                        print('*' + f"{before}\033[42m{cursor}\033[0m{after}")
-                    else:
-                        print('*' + lines[i])
-                else:
-                    print(' ' + lines[i])
+    if state.command_stack:
+        last_command = state.command_stack[-1]
+        if last_command[0] == 'i':
+            insert_text(state, last_command[1])
+        elif last_command[0] == 'a':
+            append_text(state, last_command[1])
         else:
-            for i in range(len(lines)):
-                if i == line_cursor:
-                    if show_row_cursor is True:
-                        before = lines[i][:row_cursor] if lines[i] != '' else ''
-                        if row_cursor < len(lines[i]) - 1:
-                            after = lines[i][row_cursor + 1:]
-                        else:
-                            after = ''
-                        cursor = lines[i][row_cursor] if lines[i] != '' else ''
-                        print(f"{before}\033[42m{cursor}\033[0m{after}")
-                    else:
-                        print(lines[i])
-                else:
-                    print(lines[i])
-
-valid_commands = ['?','.',';','h',
-                  'j','k','l','^',
-                  '$','b','w','x',
-                  'dw','yy','p','P',
-                  'dd','o','O','u',
-                  'r','s','q']
+            REPEAT_COMMANDS[last_command[0]](state)
+
+def show_content(state):
+    """Display current editor content with cursors."""
+    lines, line_cursor, row_cursor = state.lines, state.line_cursor, state.row_cursor
+
+    # Redrawing an unchanged document with unchanged cursors reuses the last frame
+    frame_key = (lines.version, line_cursor, row_cursor,
+                 state.show_line_cursor, state.show_row_cursor)
+    if frame_key == state.frame_key:
+        sys.stdout.write(state.frame)
+        return
+
+    # Every line but the current one renders the same way for a given mode
+    if state.show_line_cursor is True:
+        out = [' ' + line for line in lines]
+    else:
+        out = list(lines)
+
+    if 0 <= line_cursor < len(lines):
+        line = lines[line_cursor]
+        if state.show_row_cursor is True:
+            # Draw a cursor left at -1 or past the end on the nearest character
+            col = min(max(row_cursor, 0), len(line) - 1)
+            cursor = line[col] if line != '' else ''
+            line = f"{line[:col]}{_GREEN}{cursor}{_RESET}{line[col + 1:]}"
+        if state.show_line_cursor is True:
+            line = '*' + line
+        out[line_cursor] = line
+
+    frame = '\n'.join(out) + '\n' if out else ''
+    state.frame_key, state.frame = frame_key, frame
+    sys.stdout.write(frame)
+
+valid_commands = frozenset(['?','.',';','h',
+                            'j','k','l','^',
+                            '$','b','w','x',
+                            'dw','yy','p','P',
+                            'dd','o','O','u',
+                            'r','s','q'])
 
 def parse_input(user_input):
     """Parse user input into command and text."""
-    if user_input in valid_commands:
-        return True
-
+    return user_input in valid_commands or user_input.startswith(('i', 'a'))
+
+# Commands that take no text, followed by a redraw of the content
+COMMANDS = {
+    '.': toggle_row_cursor,
+    ';': toggle_line_cursor,
+    'h': move_left,
+    'l': move_right,
+    'j': move_up,
+    'k': move_down,
+    '^': move_line_start,
+    '$': move_line_end,
+    'b': move_prev_word_start,
+    'w': move_next_word_start,
+    'x': delete_char,
+    'dw': delete_word,
+    'yy': copy_line,
+    'P': paste_above,
+    'p': paste_below,
+    'dd': delete_line,
+    'o': insert_empty_line_below,
+    'O': insert_empty_line_above,
+    'u': undo_last,
+    'r': repeat_last,
+}
+
+def read_commands():
+    """Yield commands typed at the prompt, or piped in without prompting."""
+    if sys.stdin.isatty():
+        while True:
+            try:
+                yield input('>')
+            except EOFError:
+                return
     else:
-        if user_input.startswith('i') or user_input.startswith('a'):
-            return True
-        else:
-            return False
+        # Replayed scripts are read through the buffered stdin iterator
+        for line in sys.stdin:
+            yield line.rstrip('\n')
 
 def main():
     """Main loop to process user commands."""
-    global copied_line
-
-    while True:
-        user_input = input('>')
-        cmd = user_input
-        if parse_input(user_input):
-            if cmd == '?':
-                display_help()
-            elif cmd == '.':
-                toggle_row_cursor()
-                show_content()
-            elif cmd == ';':
-                toggle_line_cursor()
-                show_content()
-            elif cmd == 'h':
-                move_left()
-                show_content()
-            elif cmd == 'l':
-                move_right()
-                show_content()
-            elif cmd == 'j':
-                move_up()
-                show_content()
-            elif cmd == 'k':
-                move_down()
-                show_content()
-            elif cmd == '^':
-                move_line_start()
-                show_content()
-            elif cmd == '$':
-                move_line_end()
-                show_content()
-            elif cmd == 'b':
-                move_prev_word_start()
-                show_content()
-            elif cmd == 'w':
-                move_next_word_start()
-                show_content()
-            elif cmd.startswith('i'):
-                insert_text(cmd[1:])
-                show_content()
-            elif cmd.startswith('a'):
-                append_text(cmd[1:])
-                show_content()
-            elif cmd == 'x':
-                delete_char()
-                show_content()
-            elif cmd == 'dw':
-                delete_word()
-                show_content()
-            elif cmd == 'yy':
-                copied_line = lines[line_cursor]
-                show_content()
-            elif cmd == 'P':
-                paste_above()
-                show_content()
-            elif cmd == 'p':
-                paste_below()
-                show_content()
-            elif cmd == 'dd':
-                delete_line()
-                show_content()
-            elif cmd == 'o':
-                insert_empty_line_below()
-                show_content()
-            elif cmd == 'O':
-                insert_empty_line_above()
-                show_content()
-            elif cmd == 'u':
-                undo_last()
-                show_content()
-            elif cmd == 'r':
-                repeat_last()
-                show_content()
-            elif cmd == 's':
-                show_content()
-            elif cmd == 'q':
-                break
-        else:
+    state = EditorState()
+
+    for cmd in read_commands():
+        if not parse_input(cmd):
             continue
+        if cmd == 'q':
+            break
+        if cmd == '?':
+            display_help()
+            continue
+
+        command = COMMANDS.get(cmd)
+        if command is not None:
+            command(state)
+        elif cmd.startswith('i'):
+            insert_text(state, cmd[1:])
+        elif cmd.startswith('a'):
+            append_text(state, cmd[1:])
+        show_content(state)
 
 
 if __name__ == "__main__":